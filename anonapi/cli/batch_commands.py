@@ -149,12 +149,10 @@ def reset(context: AnonAPIContext):
     if click.confirm(
         f"This will reset {len(batch.job_ids)} jobs on {batch.server}. Are you sure?"
     ):
-        for job_id in batch.job_ids:
-            logger.info(
-                context.client_tool.reset_job(
-                    server=batch.server, job_id=job_id
-                )
-            )
+        for info in context.client_tool.reset_jobs(
+            server=batch.server, job_ids=batch.job_ids
+        ):
+            logger.info(info)
 
         logger.info("Done")
     else:
@@ -226,12 +224,10 @@ def reset_error(context: AnonAPIContext):
     if click.confirm(
         f"This will reset {len(job_ids)} jobs on {batch.server}. Are you sure?"
     ):
-        for job_id in job_ids:
-            logger.info(
-                context.client_tool.reset_job(
-                    server=batch.server, job_id=job_id
-                )
-            )
+        for info in context.client_tool.reset_jobs(
+            server=batch.server, job_ids=job_ids
+        ):
+            logger.info(info)
 
         logger.info("Done")
     else:
@@ -254,12 +250,12 @@ def show_error(context: AnonAPIContext):
     ]
 
     if error_infos:
-        output = ""
-        for info in error_infos:
-            output += f"{format_job_info_list([info])}\n"
-            output += "error message:\n"
-            output += f"{info.error}\n\n"
-
+        output = "".join(
+            f"{format_job_info_list([info])}\n"
+            "error message:\n"
+            f"{info.error}\n\n"
+            for info in error_infos
+        )
         logger.info(output)
     else:
         logger.info("There are no jobs with error status in this batch")
@@ -1,13 +1,16 @@
 """Anonymization web API client. Can interface with Anonymization server to retrieve,
 create, modify anonymization jobs
 """
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple, Type
 
 import requests
 import json
 
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from requests.models import Response
+from urllib3.util.retry import Retry
 
 from anonapi.exceptions import AnonAPIError
 from anonapi.objects import RemoteAnonServer
@@ -21,7 +24,18 @@ from anonapi.responses import (
 
 
 class WebAPIClient:
-    def __init__(self, hostname, username, token, validate_https=True):
+    # (hostname, username, token) combinations refused by the server
+    _AUTH_BLACKLIST: Set[Tuple[str, str, str]] = set()
+
+    def __init__(
+        self,
+        hostname,
+        username,
+        token,
+        validate_https=True,
+        post_json=False,
+        session=None,
+    ):
         """Makes calls to hug web API, handles errors
 
         Parameters
@@ -35,6 +49,14 @@ class WebAPIClient:
         validate_https: bool, optional
             if True, raise error if api https certificate cannot be verified. If
             False, just show warning. Default value True
+        post_json: bool, optional
+            if True, send post arguments as JSON body instead of form-encoded.
+            Falls back to form-encoded if server does not accept JSON.
+            Default value False
+        session: requests.Session, optional
+            Make http calls with this session. Share a session between clients
+            to re-use connections. Defaults to a new session from
+            create_session()
 
         """
 
@@ -42,8 +64,11 @@ class WebAPIClient:
         self.username = username
         self.token = token
         self.validate_https = bool(validate_https)
+        self.post_json = bool(post_json)
+        if session is None:
+            session = create_session()
         self.requestslib = (
-            requests  # mostly for clean testing. Allows to switch
+            session  # mostly for clean testing. Allows to switch
         )
         # out the actual http-calling code
 
@@ -81,7 +106,25 @@ class WebAPIClient:
         APIClientError:
             When server is responding, but the response cannot be parsed
         """
+        response, error = self.get_or_error(function_name, **kwargs)
+        if error:
+            raise error.to_exception() from error.cause
+        return response
+
+    def get_or_error(
+        self, function_name, **kwargs
+    ) -> Tuple[Optional[Dict], Optional["APIErrorInfo"]]:
+        """Like get(), but returns any error instead of raising it. Cheaper when
+        calling many times with expected failures
 
+        Returns
+        -------
+        Tuple[Optional[Dict], Optional[APIErrorInfo]]
+            Results of the API call and None, or None and the error
+        """
+        error = self.auth_error()
+        if error:
+            return None, error
         function_url = self.hostname + "/" + function_name
 
         try:
@@ -92,9 +135,9 @@ class WebAPIClient:
                 headers={"Authorization": f"Token {self.token}"},
             )
         except RequestException as e:
-            raise ServerNotResponding from e
+            return None, APIErrorInfo(ServerNotResponding, "", cause=e)
 
-        return self.parse_response(response)
+        return self.parse_response_or_error(response)
 
     def post(self, function_name, **kwargs):
         """Call this api, get response back
@@ -127,20 +170,68 @@ class WebAPIClient:
         APIClientError:
             When server is responding, but the response cannot be parsed
         """
+        response, error = self.post_or_error(function_name, **kwargs)
+        if error:
+            raise error.to_exception() from error.cause
+        return response
 
+    def post_or_error(
+        self, function_name, **kwargs
+    ) -> Tuple[Optional[Dict], Optional["APIErrorInfo"]]:
+        """Like post(), but returns any error instead of raising it. Cheaper when
+        calling many times with expected failures
+
+        Returns
+        -------
+        Tuple[Optional[Dict], Optional[APIErrorInfo]]
+            Results of the API call and None, or None and the error
+        """
+        error = self.auth_error()
+        if error:
+            return None, error
         function_url = self.hostname + "/" + function_name
+        args = self.add_user_name_to_args(kwargs)
+        headers = {"Authorization": f"Token {self.token}"}
         try:
-            response = self.requestslib.post(
-                function_url,
-                data=self.add_user_name_to_args(kwargs),
-                verify=self.validate_https,
-                headers={"Authorization": f"Token {self.token}"},
+            if self.post_json:
+                response = self.requestslib.post(
+                    function_url,
+                    data=json.dumps(args, default=str),
+                    verify=self.validate_https,
+                    headers={**headers, "Content-Type": "application/json"},
+                )
+                if response.status_code == 415:
+                    # Unsupported media type. Server does not accept JSON
+                    self.post_json = False
+            if not self.post_json:
+                response = self.requestslib.post(
+                    function_url,
+                    data=args,
+                    verify=self.validate_https,
+                    headers=headers,
+                )
+        except RequestException as e:
+            return None, APIErrorInfo(ServerNotResponding, "", cause=e)
+
+        return self.parse_response_or_error(response)
+
+    def auth_error(self) -> Optional["APIErrorInfo"]:
+        """Error if the server has refused these credentials before, else None"""
+        if self.credentials() in self._AUTH_BLACKLIST:
+            return APIErrorInfo(
+                APIClientAuthorizationFailedException,
+                f"Server '{self.hostname}' returned 401 - Unauthorized earlier,"
+                f" Your credentials do not seem to work. Not calling again",
             )
-        except requests.exceptions.RequestException as e:
-            raise ServerNotResponding from e
+        return None
+
+    def credentials(self) -> Tuple[str, str, str]:
+        """(hostname, username, token) used to call the server"""
+        return self.hostname, self.username, self.token
 
-        self.parse_response(response)
-        return json.loads(response.text)
+    def reset_auth(self):
+        """Forget any earlier authorization failure for these credentials"""
+        self._AUTH_BLACKLIST.discard(self.credentials())
 
     def add_user_name_to_args(self, args_in):
         """Add parameter 'user_name' to args_in using username found in settings,
@@ -181,8 +272,12 @@ class WebAPIClient:
         # call API without function to get hug to return standard 404 + documentation
 
         response = self.get("")
-
-        return response["documentation"]
+        try:
+            return response["documentation"]
+        except KeyError as e:
+            raise APIClientError(
+                f"No documentation found when calling {self}"
+            ) from e
 
     def parse_json(self, text: str) -> Dict:
         """Parse string as json
@@ -197,11 +292,20 @@ class WebAPIClient:
         Dict
             Json parsed
         """
+        parsed, error = self.parse_json_or_error(text)
+        if error:
+            raise error.to_exception() from error.cause
+        return parsed
+
+    def parse_json_or_error(
+        self, text: str
+    ) -> Tuple[Optional[Dict], Optional["APIErrorInfo"]]:
+        """Parse string as json. Return any error instead of raising"""
         try:
-            return json.loads(text)
+            return json.loads(text), None
         except json.decoder.JSONDecodeError as e:
             msg = f"response from {self} was not JSON. Is this a web API url?"
-            raise APIClientError(msg) from e
+            return None, APIErrorInfo(APIClientError, msg, cause=e)
 
     def parse_response(self, response: Response) -> Dict:
         """Extract a anonAPI dictionary from raw HTTP response
@@ -222,9 +326,25 @@ class WebAPIClient:
             When any unexpected response is returned
 
         """
+        parsed, error = self.parse_response_or_error(response)
+        if error:
+            raise error.to_exception() from error.cause
+        return parsed
+
+    def parse_response_or_error(
+        self, response: Response
+    ) -> Tuple[Optional[Dict], Optional["APIErrorInfo"]]:
+        """Extract a anonAPI dictionary from raw HTTP response. Return any error
+        instead of raising it. See parse_response() for the possible errors
+
+        Returns
+        -------
+        Tuple[Optional[Dict], Optional[APIErrorInfo]]
+            The dictionary and None, or None and the error
+        """
 
         if response.status_code == 200:
-            return self.parse_json(response.text)
+            return self.parse_json_or_error(response.text)
 
         elif response.status_code == 404:
             # 404 does not mean the API is unresponsive. This is returned for
@@ -232,38 +352,49 @@ class WebAPIClient:
 
             # differentiate a 'good' API 404 from just any non API 404 response
             # (bad). API 404 should be json parsable and contain a key 'documentation'
-            json_parsed = self.parse_json(response.text)
+            json_parsed, error = self.parse_json_or_error(response.text)
+            if error:
+                return None, error
             if "documentation" in json_parsed.keys():
-                return json_parsed
+                return json_parsed, None
             else:
-                raise APIClientError(
-                    f"No documentation found when calling {self} is this a web API?"
+                return None, APIErrorInfo(
+                    APIClientError,
+                    f"No documentation found when calling {self} is this a web API?",
                 )
 
         elif response.status_code == 401:
-            raise APIClientAuthorizationFailedException(
+            self._AUTH_BLACKLIST.add(self.credentials())
+            return None, APIErrorInfo(
+                APIClientAuthorizationFailedException,
                 f"Server '{self.hostname}' returned 401 - Unauthorized, Your"
-                f" credentials do not seem to work"
+                f" credentials do not seem to work",
             )
 
         elif response.status_code == 400:
             # API responds correctly, but indicates an error. Pass this error on
-            raise APIClientAPIException(
+            json_parsed, error = self.parse_json_or_error(response.text)
+            if error:
+                return None, error
+            return None, APIErrorInfo(
+                APIClientAPIException,
                 f"API returns errors: {response.text}",
-                api_errors=self.parse_json(response.text).get("errors", None),
+                api_errors=json_parsed.get("errors", None),
             )
 
         elif response.status_code == 405:
-            raise APIClientError(
+            return None, APIErrorInfo(
+                APIClientError,
                 f"'{self}' returned 405 - Method not allowed. Probably you are "
                 f"using GET where POST is needed, or vice versa. See "
-                f"APIClient.get_documentation() for usage"
+                f"APIClient.get_documentation() for usage",
             )
 
         else:
-            raise APIClientError(
+            return None, APIErrorInfo(
+                APIClientError,
                 f"Unexpected response from {self}: code '{response.status_code}'"
-                f", reason '{response.reason}'"
+                f", reason '{response.reason}'",
             )
 
 
@@ -293,6 +424,8 @@ class AnonClientTool:
         self.username = username
         self.token = token
         self.validate_https = validate_https
+        self._bulk_support: Dict[str, bool] = {}  # server url: supports bulk
+        self._session = None  # shared by all clients. Created on first use
 
     def get_client(self, url):
         """Create an API client with the information in this tool
@@ -301,11 +434,14 @@ class AnonClientTool:
         -------
         WebAPIClient
         """
+        if self._session is None:
+            self._session = create_session()
         client = WebAPIClient(
             hostname=url,
             username=self.username,
             token=self.token,
             validate_https=self.validate_https,
+            session=self._session,
         )
         return client
 
@@ -447,12 +583,10 @@ class AnonClientTool:
             a input describing success or any API error
         """
         client = self.get_client(server.url)
-        try:
-            _ = client.post("cancel_job", job_id=job_id)
-            info = f"Cancelled job {job_id} on {server.name}"
-        except APIClientError as e:
-            info = f"Error cancelling job on{server}:\n{str(e)}"
-        return info
+        _, error = client.post_or_error("cancel_job", job_id=job_id)
+        if error:
+            return f"Error cancelling job on{server}:\n{error}"
+        return f"Cancelled job {job_id} on {server.name}"
 
     def reset_job(self, server, job_id):
         """Reset job status, error and downloaded/processed counters
@@ -464,19 +598,17 @@ class AnonClientTool:
         """
 
         client = self.get_client(server.url)
-        try:
-            _ = client.post(
-                "modify_job",
-                job_id=job_id,
-                status="ACTIVE",
-                files_downloaded=0,
-                files_processed=0,
-                error=" ",
-            )
-            info = f"Reset job {job_id} on {server}"
-        except APIClientError as e:
-            info = f"Error resetting job on{server.name}:\n{str(e)}"
-        return info
+        _, error = client.post_or_error(
+            "modify_job",
+            job_id=job_id,
+            status="ACTIVE",
+            files_downloaded=0,
+            files_processed=0,
+            error=" ",
+        )
+        if error:
+            return f"Error resetting job on{server.name}:\n{error}"
+        return f"Reset job {job_id} on {server}"
 
     def set_opt_out_ignore(
         self, server: RemoteAnonServer, job_id: str, reason: str
@@ -490,19 +622,121 @@ class AnonClientTool:
         """
 
         client = self.get_client(server.url)
-        try:
-            _ = client.post(
-                "modify_job",
-                job_id=job_id,
-                source_ignore_opt_out=True,
-                source_ignore_opt_out_reason=f"Reason: {reason}",
+        _, error = client.post_or_error(
+            "modify_job",
+            job_id=job_id,
+            source_ignore_opt_out=True,
+            source_ignore_opt_out_reason=f"Reason: {reason}",
+        )
+        if error:
+            return f"Error setting opt-out ignore on{server.name}:\n{error}"
+        return f"Set opt-out ignore ({reason}) for job {job_id} on {server}"
+
+    def supports_bulk_modify(self, server: RemoteAnonServer) -> bool:
+        """Does this server offer the bulk job modification API function?
+
+        Checks the server's documentation once and caches the result per
+        server. If documentation cannot be retrieved, returns False without
+        caching
+
+        Returns
+        -------
+        bool
+            True if BULK_MODIFY_FUNCTION is available on server
+        """
+        if server.url not in self._bulk_support:
+            try:
+                documentation = self.get_client(server.url).get_documentation()
+            except APIClientError:
+                return False  # might be temporary. Check again next time
+            handlers = (
+                documentation.get("handlers", {})
+                if isinstance(documentation, dict)
+                else {}
             )
-            info = (
-                f"Set opt-out ignore ({reason}) for job {job_id} on {server}"
+            self._bulk_support[server.url] = BULK_MODIFY_FUNCTION in {
+                str(url).strip("/") for url in handlers
+            }
+        return self._bulk_support[server.url]
+
+    def reset_jobs(self, server: RemoteAnonServer, job_ids: List[str]):
+        """Reset status, error and downloaded/processed counters for each job
+
+        Uses a single bulk call if the server supports this. Otherwise resets
+        each job separately, but concurrently
+
+        Returns
+        -------
+        List[str]
+            a input describing success or any API error for each job
+        """
+        if not self.supports_bulk_modify(server):
+            return self._for_each_job(
+                job_ids, lambda job_id: self.reset_job(server, job_id)
             )
-        except APIClientError as e:
-            info = f"Error setting opt-out ignore on{server.name}:\n{str(e)}"
-        return info
+
+        client = self.get_client(server.url)
+        _, error = client.post_or_error(
+            BULK_MODIFY_FUNCTION,
+            job_ids=job_ids,
+            status="ACTIVE",
+            files_downloaded=0,
+            files_processed=0,
+            error=" ",
+        )
+        if error:
+            return [
+                f"Error resetting job {job_id} on {server.name}:\n{error}"
+                for job_id in job_ids
+            ]
+        return [f"Reset job {job_id} on {server}" for job_id in job_ids]
+
+    def set_opt_out_ignore_bulk(
+        self, server: RemoteAnonServer, job_ids: List[str], reason: str
+    ):
+        """Set opt-out ignore with a reason for each given job
+
+        Uses a single bulk call if the server supports this. Otherwise modifies
+        each job separately, but concurrently
+
+        Returns
+        -------
+        List[str]
+            a input describing success or any API error for each job
+        """
+        if not self.supports_bulk_modify(server):
+            return self._for_each_job(
+                job_ids,
+                lambda job_id: self.set_opt_out_ignore(server, job_id, reason),
+            )
+
+        client = self.get_client(server.url)
+        _, error = client.post_or_error(
+            BULK_MODIFY_FUNCTION,
+            job_ids=job_ids,
+            source_ignore_opt_out=True,
+            source_ignore_opt_out_reason=f"Reason: {reason}",
+        )
+        if error:
+            return [
+                f"Error setting opt-out ignore for job {job_id} on "
+                f"{server.name}:\n{error}"
+                for job_id in job_ids
+            ]
+        return [
+            f"Set opt-out ignore ({reason}) for job {job_id} on {server}"
+            for job_id in job_ids
+        ]
+
+    @staticmethod
+    def _for_each_job(job_ids: List[str], func) -> List[str]:
+        """Call func(job_id) for each job id concurrently. Keeps job id order"""
+        if not job_ids:
+            return []
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_CONCURRENT_REQUESTS, len(job_ids))
+        ) as executor:
+            return list(executor.map(func, job_ids))
 
     def create_path_job(
         self,
@@ -623,6 +857,81 @@ class AnonClientTool:
         return JobInfo.from_json(response_dict)
 
 
+# API function that modifies multiple jobs in a single call. Not on all servers
+BULK_MODIFY_FUNCTION = "modify_jobs_bulk"
+
+# Maximum number of simultaneous requests when calling API for multiple jobs
+MAX_CONCURRENT_REQUESTS = 8
+
+
+def create_session() -> requests.Session:
+    """A requests session that retries failed connections and temporary server
+    errors, with exponential backoff
+
+    Only GET calls are retried once the request has been sent. Retrying a POST
+    like 'create_job' after that could have unintended side effects.
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,  # return last response. parse_response handles it
+    )
+    adapter = HTTPAdapter(max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class APIErrorInfo:
+    """Description of a failed API call. Returned instead of raised where many
+    calls might fail and only the message is needed
+    """
+
+    __slots__ = ("exception_type", "message", "api_errors", "cause")
+
+    def __init__(
+        self,
+        exception_type: Type["APIClientError"],
+        message: str,
+        api_errors: Optional[Dict] = None,
+        cause: Optional[Exception] = None,
+    ):
+        """
+
+        Parameters
+        ----------
+        exception_type: Type[APIClientError]
+            The exception that this error would be when raised
+        message: str
+            error message to show
+        api_errors: Dict, optional
+            one key:value pair per error, if returned by API. Defaults to None
+        cause: Exception, optional
+            Underlying exception, if any. Defaults to None
+        """
+        self.exception_type = exception_type
+        self.message = message
+        self.api_errors = api_errors
+        self.cause = cause
+
+    def __str__(self):
+        return self.message
+
+    def to_exception(self) -> "APIClientError":
+        """Build an exception instance for this error, ready for raising"""
+        if issubclass(self.exception_type, APIClientAPIException):
+            return self.exception_type(
+                self.message, api_errors=self.api_errors
+            )
+        else:
+            return self.exception_type(self.message)
+
+
 class ClientInterfaceError(AnonAPIError):
     """A general problem with client interface"""
 
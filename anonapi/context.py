@@ -46,15 +46,12 @@ class AnonAPIContext:
             A concise, printable overview of servers
 
         """
-        server_list = ""
+        active_server = self.settings.active_server
+        lines = []
         for server in self.settings.servers:
-            line = f"{server.name:<10} {server.url}"
-            if server == self.settings.active_server:
-                line = "* " + line
-            else:
-                line = "  " + line
-            server_list += line + "\n"
-        return server_list
+            marker = "* " if server == active_server else "  "
+            lines.append(f"{marker}{server.name:<10} {server.url}\n")
+        return "".join(lines)
 
     def get_server_by_name(self, short_name):
         """Get the server with given name from the list of servers
@@ -69,15 +66,15 @@ class AnonAPIContext:
         RemoteAnonServer
             The server with the given name
         """
-        server_list = {x.name: x for x in self.settings.servers}
-        if short_name not in server_list.keys():
-            msg = (
-                f"Unknown server '{short_name}'. Please choose one "
-                f"of {[x.name for x in self.settings.servers]}"
-            )
-            raise AnonAPIContextError(msg)
+        for server in self.settings.servers:
+            if server.name == short_name:
+                return server
 
-        return server_list[short_name]
+        msg = (
+            f"Unknown server '{short_name}'. Please choose one "
+            f"of {[x.name for x in self.settings.servers]}"
+        )
+        raise AnonAPIContextError(msg)
 
     def get_active_server(self):
         """Active server can be None, hence the check and exception
@@ -102,12 +99,6 @@ class AnonAPIContext:
             raise AnonAPIContextError(msg)
         return server
 
-    def current_dir(self):
-        """Return full path to the folder this context is
-        called from
-        """
-        return self.current_dir
-
     def get_batch(self) -> JobBatch:
         """Get batch defined in current folder
 
@@ -11,6 +11,14 @@ from anonapi.exceptions import AnonAPIError
 
 pass_anonapi_context = click.make_pass_decorator(AnonAPIContext)
 
+# Error messages are shown in red. Build the ansi codes for this only once
+_RED = click.style("", fg="red", reset=False)
+_RESET = click.style("", reset=True)
+_NO_BATCH_MESSAGE = (
+    "No batch defined in current folder. You can create one with "
+    "'anon batch init'. Orignal error: '{}'"
+)
+
 
 def handle_anonapi_exceptions(func):
     """Catch any AnonAPIExceptions and raise as ClickExceptions. This means no
@@ -28,13 +36,9 @@ def handle_anonapi_exceptions(func):
             return func(*args, **kwargs)
         except NoBatchDefinedError as e:
             raise ClickException(
-                click.style(
-                    f"No batch defined in current folder. You can create "
-                    f"one with 'anon batch init'. Orignal error: '{e}'",
-                    fg="red",
-                )
+                _RED + _NO_BATCH_MESSAGE.format(e) + _RESET
             ) from e
         except AnonAPIError as e:
-            raise ClickException(click.style(f"{e}", fg="red")) from e
+            raise ClickException(f"{_RED}{e}{_RESET}") from e
 
     return wrapper
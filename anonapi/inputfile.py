@@ -6,11 +6,20 @@ It is often easier to add such a file to a mapping programatically then to
 copy-paste between open files
 """
 import csv
+import logging
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
-from typing import Iterator, List, Type, Union, Optional
-
-from openpyxl.reader.excel import load_workbook
-from openpyxl.utils.exceptions import InvalidFileException
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 from anonapi.exceptions import AnonAPIError
 from anonapi.logging import get_module_logger
@@ -27,6 +36,20 @@ from anonapi.parameters import (
 
 logger = get_module_logger(__name__)
 
+# extract_parameter_grid parses this many rows at a time
+GRID_CHUNK_SIZE = 4096
+
+# For removing separators from header names
+_STRIP_TABLE = str.maketrans("", "", " _-.")
+
+
+@lru_cache(maxsize=1024)
+def _clean_string(string: str) -> str:
+    """Make lowercase and remove separators. Cached as the same header names
+    are cleaned over and over
+    """
+    return string.translate(_STRIP_TABLE).lower()
+
 
 class ParameterColumn:
     """A column of Parameter instances, like accession numbers or pseudonyms
@@ -42,6 +65,12 @@ class ParameterColumn:
     # the type of parameter that this column contains
     parameter_type: Type[Parameter] = Parameter
 
+    # header_names, cleaned. Set for each subclass in __init_subclass__
+    _cleaned_headers: FrozenSet[str] = frozenset()
+
+    # first of header_names. Set for each subclass in __init_subclass__
+    _header_name: str = ""
+
     def __init__(self, column: int, header_row_idx: int = 0):
         """
 
@@ -55,6 +84,11 @@ class ParameterColumn:
         """
         self.column = column
         self.header_row_idx = header_row_idx
+        # bound once here, as parameter_from_value is called for each cell
+        self._parse = partial(
+            ParameterFactory.parse_from_value,
+            parameter_type=self.parameter_type,
+        )
 
     def __str__(self) -> str:
         if self.header_names:
@@ -62,57 +96,80 @@ class ParameterColumn:
         else:
             return "Column"
 
-    @staticmethod
-    def clean_string(string: str):
-        """Make lowercase and remove separators"""
-        return (
-            string.replace(" ", "")
-            .replace("_", "")
-            .replace("-", "")
-            .replace(".", "")
-            .lower()
+    def __init_subclass__(cls, **kwargs):
+        """Clean header names once for each column type, not for each cell"""
+        super().__init_subclass__(**kwargs)
+        cls._cleaned_headers = frozenset(
+            _clean_string(x) for x in cls.header_names
         )
+        cls._header_name = cls.header_names[0] if cls.header_names else ""
+
+    # Make lowercase and remove separators
+    clean_string = staticmethod(_clean_string)
 
     @classmethod
     def matches_header(cls, input: Union[str, None]) -> bool:
         """The given input seems to be this column's header"""
-        if input is None:
-            return False
-        if cls.clean_string(input) in [
-            cls.clean_string(x) for x in cls.header_names
-        ]:
-            return True
-        else:
-            return False
+        return (
+            isinstance(input, str)
+            and _clean_string(input) in cls._cleaned_headers
+        )
 
     @classmethod
     def header_name(cls) -> str:
         """A header name that his header might have. For helpful error messages"""
-        if cls.header_names:
-            return cls.header_names[0]
-        else:
-            return ""
+        return cls._header_name
 
     def parameter_from_row(self, row: List[str]) -> Parameter:
         """Try to parse a Parameter instance out of a row from the grid
 
+        Deprecated. Kept for backwards compatibility, use
+        parameter_from_value(row[column]) instead
+
         Raises
         ------
-        InputFileParseException
+        ParameterParsingError
             When this row cannot be parsed into the expected Parameter type
         """
-        try:
-            return ParameterFactory.parse_from_key_value(
-                key=self.parameter_type.field_name,
-                value=row[self.column],
-                parameter_types=[self.parameter_type],
-            )
-        except ParameterParsingError as e:
-            raise InputFileParseException() from e
+        return self.parameter_from_value(row[self.column])
+
+    def parameter_from_value(self, value: Optional[str]) -> Parameter:
+        """Parse a Parameter instance from the value of a cell in this column
+
+        Raises
+        ------
+        ParameterParsingError
+            When value cannot be parsed into the expected Parameter type
+        """
+        # most cells are str already. Check that first, it's cheapest
+        if type(value) is not str and value is not None:
+            value = str(value)  # cells in excel files can be numbers, dates
+        return self._parse(value)
+
+    def parameters_from_values(
+        self, values: List[Optional[str]]
+    ) -> List[Parameter]:
+        """Parse a Parameter instance from each value. Faster than calling
+        parameter_from_value() for each
+
+        Raises
+        ------
+        ParameterParsingError
+            When any value cannot be parsed into the expected Parameter type
+        """
+        parse = self._parse
+        return [
+            parse(x if type(x) is str or x is None else str(x)) for x in values
+        ]
 
     def has_empty_value(self, row: List[str]) -> bool:
-        """True if the given row has no value in this column"""
+        """True if the given row has no value in this column
 
+        Deprecated. Kept for backwards compatibility, empty rows are detected
+        by parse_rows() now
+        """
+        if self.column >= len(row):
+            return True  # csv rows can be shorter than the header row
         return row[self.column] == "" or row[self.column] is None
 
 
@@ -146,7 +203,10 @@ class TabularFile:
         Returns
         -------
         Iterator[List[str]]
-            Returns list of strings for each row in file
+            Returns list of values for each row in file. Values are strings,
+            except for empty cells, which can be None. Some formats, like excel,
+            can also return numbers or dates. ParameterColumn converts these
+            to string only when parsing
 
         Raises
         ------
@@ -174,10 +234,15 @@ class ExcelFile(TabularFile):
     def rows(self) -> Iterator[List[str]]:
         """Iterates over each row in file
 
+        Notes
+        -----
+        File is opened on first iteration, and closed when iteration finishes
+
         Returns
         -------
         Iterator[List[str]]
-            Returns list of strings for each row in file
+            Returns values for each row in file, as read from the file. These
+            are not cast to string. See TabularFile.rows()
 
         Raises
         ------
@@ -186,14 +251,45 @@ class ExcelFile(TabularFile):
 
         """
         logger.info(f"Parsing '{self.path}'..")
+
+        # imported here as openpyxl is slow to import and not needed for csv
+        from openpyxl.reader.excel import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+
         try:
-            wb2 = load_workbook(self.path)
+            # read-only mode streams rows instead of loading all cells at once
+            wb2 = load_workbook(
+                self.path, read_only=True, data_only=True, keep_links=False
+            )
         except (InvalidFileException, FileNotFoundError) as e:
             raise InputFileError(f"Error reading '{self.path}'") from e
 
-        sheet = wb2[wb2.sheetnames[0]]  # read first sheet, ignore others
+        try:
+            sheet = wb2[wb2.sheetnames[0]]  # read first sheet, ignore others
+            yield from self.drop_trailing_empty_rows(
+                sheet.iter_rows(values_only=True)
+            )
+        finally:
+            wb2.close()  # read-only mode keeps file open until closed
+
+    @staticmethod
+    def drop_trailing_empty_rows(iterator: Iterator[tuple]) -> Iterator[tuple]:
+        """Skip empty rows at the end. Keep empty rows in between others
+
+        In read-only mode, openpyxl yields all rows in the sheet's stated
+        dimensions. This can be up to a million empty rows for sheets with
+        formatted but otherwise empty rows
+        """
+        empty_count = 0  # number of empty rows not yet yielded
+        for row in iterator:
+            if row.count(None) == len(row):
+                empty_count += 1
+                continue
+            for _ in range(empty_count):
+                yield (None,) * len(row)
+            empty_count = 0
+            yield row
 
-        return self.cast_rows_to_string(sheet.values)
 
     @staticmethod
     def cast_rows_to_string(
@@ -201,21 +297,19 @@ class ExcelFile(TabularFile):
     ) -> Iterator[List[Optional[str]]]:
         """For standardizing data from grid-like files. Make everything string,
         except None values. Keep those None.
-        """
-
-        def str_preserve_none(input):
-            if input is None:
-                return None
-            else:
-                return str(input)
 
+        Deprecated. Kept for backwards compatibility, rows() does not use this
+        anymore. Values are cast to string when parsing
+        """
         for row in iterator:
-            yield list(map(str_preserve_none, row))
-
+            yield [x if type(x) is str or x is None else str(x) for x in row]
 
 class CSVFile(TabularFile):
     """A comma separated text file. Also accepts colon separated"""
 
+    # number of lines at the start of the file used to determine dialect
+    SNIFF_LINES = 16
+
     def __init__(self, path: Path):
         self.path = path
 
@@ -227,7 +321,8 @@ class CSVFile(TabularFile):
 
         Notes
         -----
-        Reads entire file into memory so might not work well for larger files
+        File is opened on first iteration, and closed when iteration finishes.
+        Dialect is determined from the start of the file only
 
         Returns
         -------
@@ -242,18 +337,32 @@ class CSVFile(TabularFile):
         """
         logger.info(f"Parsing '{self.path}'..")
         try:
-            with open(self.path) as f:
-                lines = f.readlines()
-                rows = [
-                    row
-                    for row in csv.reader(
-                        lines, dialect=sniff_dialect_safe(lines)
-                    )
-                ]
+            f = open(self.path, newline="")
         except FileNotFoundError as e:
             raise InputFileError() from e
 
-        return iter(rows)
+        with f:
+            if self.is_plain_comma_separated(f.readline()):
+                dialect = csv.excel  # most common case. No need to sniff
+            else:
+                f.seek(0)
+                dialect = sniff_dialect_safe(islice(f, self.SNIFF_LINES))
+            f.seek(0)
+            yield from csv.reader(f, dialect=dialect)
+
+    @staticmethod
+    def is_plain_comma_separated(line: str) -> bool:
+        """True if line is separated by commas only, without any quotes,
+        semicolons or spaces after commas. The default excel dialect reads
+        this correctly without having to sniff the dialect
+        """
+        return (
+            "," in line
+            and ", " not in line
+            and ";" not in line
+            and '"' not in line
+            and "'" not in line
+        )
 
 
 def as_tabular_file(path: Union[str, Path]) -> TabularFile:
@@ -288,6 +397,20 @@ def as_tabular_file(path: Union[str, Path]) -> TabularFile:
         )
 
 
+@lru_cache(maxsize=32)
+def _header_lookup(
+    column_types: Tuple[Type[ParameterColumn], ...],
+) -> Dict[str, Type[ParameterColumn]]:
+    """Cleaned header name -> column type, for all column types at once. If a
+    header name fits several column types, the first column type wins
+    """
+    lookup = {}
+    for column_type in column_types:
+        for header in column_type._cleaned_headers:
+            lookup.setdefault(header, column_type)
+    return lookup
+
+
 def parse_columns(
     row: List[str], column_types: List[Type[ParameterColumn]]
 ) -> List[ParameterColumn]:
@@ -298,19 +421,32 @@ def parse_columns(
     row: List[str]
         The row of values to parse
     column_types: List[Type[ParameterColumn]]
-        The types of columns to try
+        The types of columns to try. Each type is matched to the first cell
+        that fits, at most once
 
     """
     columns = []
+    lookup = _header_lookup(tuple(column_types))
+    matched = set()  # each column type is matched at most once
 
     for idx, item in enumerate(row):
-        for column_type in column_types:
-            if column_type.matches_header(item):
-                logger.debug(
-                    f"Matched '{item}' in row {row}, column {idx} to column type "
-                    f"'{column_type.header_name()}'"
-                )
-                columns.append(column_type(column=idx))
+        if not isinstance(item, str):  # empty cell or number. Not a header
+            continue
+        column_type = lookup.get(_clean_string(item))
+        if column_type is None or column_type in matched:
+            continue
+        # lazy %-formatting. Message is only built if debug is enabled
+        logger.debug(
+            "Matched '%s' in row %s, column %d to column type '%s'",
+            item,
+            row,
+            idx,
+            column_type._header_name,
+        )
+        columns.append(column_type(column=idx))
+        matched.add(column_type)
+        if len(matched) == len(column_types):
+            break  # all types found. No need to check remaining cells
 
     return columns
 
@@ -345,10 +481,11 @@ def find_column_headers(
     for idx, row in enumerate(row_iterator):
         columns = parse_columns(row, column_types=column_types)
         if columns:
-            logger.debug(
-                f"Found {[str(x) for x in columns]} in row {idx}. "
-                f"Stopping column search"
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"Found {[str(x) for x in columns]} in row {idx}. "
+                    f"Stopping column search"
+                )
             # add column header row idx for better error messages later
             for column in columns:
                 column.header_row_idx = idx
@@ -391,38 +528,178 @@ def extract_parameter_grid(
     if required_column_types is None:
         required_column_types = []
 
-    row_iterator = file.rows()
+    row_iterator = iter(file.rows())  # rows() might return a list
+    try:
+        columns = find_column_headers(
+            row_iterator,
+            column_types=optional_column_types + required_column_types,
+        )
+        for required in required_column_types:
+            if not any(isinstance(x, required) for x in columns):
+                raise InputFileParseException(
+                    f"Required column '{required.header_name()}' not found "
+                    f"in file"
+                )
 
-    columns = find_column_headers(
-        row_iterator,
-        column_types=optional_column_types + required_column_types,
-    )
-    for required in required_column_types:
-        if not any(isinstance(x, required) for x in columns):
-            raise InputFileParseException(
-                f"Required column '{required.header_name()}' not found in file"
-            )
+        column_headers_idx = columns[0].header_row_idx
+        col_indices = tuple(x.column for x in columns)
+
+        # column headers found. Now build a grid, parsing column by column in
+        # chunks of rows.
+        grid = []
+        first_row_idx = column_headers_idx + 1
+        while True:
+            chunk = list(islice(row_iterator, GRID_CHUNK_SIZE))
+            if not chunk:
+                break
+            try:
+                grid.extend(parse_rows(chunk, columns, col_indices))
+            except (RowParseError, ParameterParsingError):
+                # parse again row by row to find out which row has the problem
+                grid.extend(
+                    _parse_rows_one_by_one(
+                        chunk, columns, col_indices, first_row_idx
+                    )
+                )
+            first_row_idx += len(chunk)
 
-    column_headers_idx = columns[0].header_row_idx
+        return JobParameterGrid(grid)
+    finally:
+        # release the file, also when reading stops before the last row
+        close = getattr(row_iterator, "close", None)
+        if close is not None:
+            close()
 
-    # column headers found. Now build a grid one row at a time
-    grid = []
-    for idx, row in enumerate(row_iterator):
+
+def _parse_rows_one_by_one(
+    rows: List[List[str]],
+    columns: List[ParameterColumn],
+    col_indices: Tuple[int, ...],
+    first_row_idx: int,
+) -> List[List[Parameter]]:
+    """Parse each row with parse_row(). Slower than parse_rows(), but gives
+    better error messages
+
+    Parameters
+    ----------
+    rows: List[List[str]]
+        Rows to parse
+    columns: List[ParameterColumn]
+        The columns to parse in each row
+    col_indices: Tuple[int, ...]
+        The column index of each of columns
+    first_row_idx: int
+        0-based index of the first of rows in the file. For error messages
+
+    Raises
+    ------
+    InputFileParseException
+        If any row cannot be parsed. Contains the row number in the file
+    """
+    parsed = []
+    # local names are faster to look up than globals in this loop
+    append = parsed.append
+    is_empty = row_is_fully_empty
+    parse = parse_row
+    for idx, row in enumerate(rows, start=first_row_idx):
+        if is_empty(row, col_indices):
+            continue  # cheaper than raising and catching EmptyRow
         try:
-            grid.append(parse_row(row, columns=columns))
+            append(parse(row, columns, col_indices))
         except EmptyRow:
             continue  # skip empty row, try next
-        except RowParseError as e:
-            # Add row number (+2 as excel rows start at 1 and both idxs are 0-based)
+        except (RowParseError, ParameterParsingError) as e:
+            # Add row number (+1 as excel rows start at 1 and idx is 0-based)
             raise InputFileParseException(
-                f"Exception in row {column_headers_idx+idx+2}"
+                f"Exception in row {idx+1}: {e}"
             ) from e
+    return parsed
+
+
+def parse_rows(
+    rows: List[List[str]],
+    columns: List[ParameterColumn],
+    col_indices: Optional[Tuple[int, ...]] = None,
+) -> List[List[Parameter]]:
+    """Parse all rows at once, one column at a time. Skips empty rows
+
+    Faster than calling parse_row() for each row, as each column type parses
+    all its values in one go
+
+    Parameters
+    ----------
+    rows: List[List[str]]
+        Rows to parse
+    columns: List[ParameterColumn])
+        The columns to parse in each row
+    col_indices: Tuple[int, ...], optional
+        The column index of each of columns. Defaults to computing from columns
 
-    return JobParameterGrid(grid)
+    Returns
+    -------
+    List[List[Parameter]]
+        For each non-empty row, each value parsed according to column type
+
+    Raises
+    ------
+    RowParseError
+        When in any row some columns are filled but not all
+    ParameterParsingError
+        When any of the values cannot be parsed according to their columns
+    """
+    if col_indices is None:
+        col_indices = tuple(x.column for x in columns)
+    if not columns:
+        return []
+
+    # pad rows that are shorter than the header row, skip empty rows
+    width = max(col_indices) + 1
+    rows = [
+        row if len(row) >= width else list(row) + [None] * (width - len(row))
+        for row in rows
+        if not row_is_fully_empty(row, col_indices)
+    ]
+
+    values_per_column = [[row[i] for row in rows] for i in col_indices]
+    for column, values in zip(columns, values_per_column):
+        # rows are not fully empty, so any empty value means partially empty
+        if None in values or "" in values:
+            raise RowParseError(
+                f"{column} is empty in a row where other columns have a "
+                f"value. What do you want?"
+            )
+
+    parsed_per_column = [
+        column.parameters_from_values(values)
+        for column, values in zip(columns, values_per_column)
+    ]
+    return [list(x) for x in zip(*parsed_per_column)]
+
+
+def row_is_fully_empty(row: List[str], col_indices: Tuple[int, ...]) -> bool:
+    """True if row has no value in any of the given columns
+
+    Parameters
+    ----------
+    row: List[str]
+        Value of each cell in this row
+    col_indices: Tuple[int, ...]
+        Check the cells with these 0-based indices
+    """
+    row_length = len(row)
+    for i in col_indices:
+        if i >= row_length:
+            continue  # csv rows can be shorter than the header row
+        value = row[i]
+        if value is not None and value != "":
+            return False
+    return True
 
 
 def parse_row(
-    row: List[str], columns: List[ParameterColumn]
+    row: List[str],
+    columns: List[ParameterColumn],
+    col_indices: Optional[Tuple[int, ...]] = None,
 ) -> List[Parameter]:
     """Is this row fit for parsing? Are there missing parameters? empty values?
 
@@ -432,6 +709,9 @@ def parse_row(
         String value of each cell in this row
     columns: List[ParameterColumn])
         The column names for each value in row
+    col_indices: Tuple[int, ...], optional
+        The column index of each of columns. Pass this when parsing many rows
+        to avoid recomputing it for each row. Defaults to computing from columns
 
     Returns
     -------
@@ -442,27 +722,39 @@ def parse_row(
     ------
     EmptyRow
         When row is empty
-    PartiallyEmptyRow
+    RowParseError
         When some columns are filled but not all
-    InputFileParseException
+    ParameterParsingError
         When any of the values in row cannot be parsed according to their columns
     """
-    filled = []
-    empty = []
-    for column in columns:
-        if column.has_empty_value(row):
-            empty.append(column)
-        else:
-            filled.append(column)
+    if col_indices is None:
+        col_indices = tuple(x.column for x in columns)
 
-    if not filled:
+    # get each value only once. Missing cells in short rows count as empty
+    row_length = len(row)
+    values = [row[i] if i < row_length else None for i in col_indices]
+
+    # bit i is set if column i has a value
+    filled_mask = 0
+    for i, value in enumerate(values):
+        if value is not None and value != "":
+            filled_mask |= 1 << i
+
+    if filled_mask == 0:
         raise EmptyRow()
-    if filled and empty:
+    if filled_mask != (1 << len(col_indices)) - 1:
+        filled = [x for i, x in enumerate(columns) if filled_mask & (1 << i)]
+        empty = [
+            x for i, x in enumerate(columns) if not filled_mask & (1 << i)
+        ]
         raise RowParseError(
             f"Problem in row {row}. Columns[{[str(x) for x in filled]}] have a value,"
             f" but columns [{[str(x) for x in empty]}] are empty. What do you want?"
         )
-    return [column.parameter_from_row(row) for column in columns]
+    return [
+        column.parameter_from_value(value)
+        for column, value in zip(columns, values)
+    ]
 
 
 class InputFileError(AnonAPIError):
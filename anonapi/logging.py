@@ -43,34 +43,35 @@ class AnonAPIFormatter(logging.Formatter):
     also, prints INFO message very plainly to not pollute regular output
     """
 
+    # (verbosity, is info message) -> format. Printing happens a lot, so build
+    # a formatter for each combination once, in __init__
+    FORMATS = {
+        (Verbosities.TERSE, True): "%(message)s",
+        (Verbosities.TERSE, False): "%(levelname)s: %(message)s",
+        (Verbosities.VERBOSE, True): "%(name)s - %(message)s",
+        (Verbosities.VERBOSE, False): "%(name)s - %(levelname)s: %(message)s",
+    }
+
     def __init__(self, verbosity: Verbosity = Verbosities.TERSE):
         super().__init__()
         self.verbosity = verbosity
-
-    @staticmethod
-    def format_record(record, pattern: str) -> str:
-        return pattern.format(**vars(record))
+        self._formatters = {
+            key: logging.Formatter(fmt) for key, fmt in self.FORMATS.items()
+        }
 
     def format(self, record: logging.LogRecord) -> str:
         """Print INFO level messages plainly, rest with level name prepended"""
-        if self.verbosity == Verbosities.TERSE:
-            if record.levelno == logging.INFO:
-                return self.format_record(record, "{msg}")
-            else:
-                return self.format_record(record, "{levelname}: {msg}")
-        elif self.verbosity == Verbosities.VERBOSE:
-            if record.levelno == logging.INFO:
-                return self.format_record(record, "{name} - {msg}")
-            else:
-                return self.format_record(
-                    record, "{name} - {levelname}: {msg}"
-                )
-        else:
+        try:
+            formatter = self._formatters[
+                (self.verbosity, record.levelno == logging.INFO)
+            ]
+        except KeyError as e:
             raise ValueError(
                 f"Unknown verbosity level {self.verbosity}. "
                 f"Allowed:"
                 f" {[Verbosities.TERSE, Verbosities.VERBOSE]}"
-            )
+            ) from e
+        return formatter.format(record)
 
 
 class AnonAPILogController:
@@ -13,11 +13,11 @@ still exist in some places in the code, referring to JobParameterGrid objects as
 mappings. This should be renamed whenever encountered
 """
 import csv
+import io
 import locale
-import os
 
 from csv import Dialect
-from typing import Dict, Iterable, List, Optional, TextIO, Union
+from typing import Iterable, List, Optional, TextIO, Union
 
 from tabulate import tabulate
 
@@ -37,15 +37,23 @@ from anonapi.parameters import (
     ParameterParsingError,
 )
 from collections import defaultdict
-from io import StringIO
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 
 DEFAULT_MAPPING_NAME = (
     "anon_mapping.csv"  # Filename for mapping if not specified
 )
 
+# Read and write mapping files in large blocks. Fewer system calls. Reading
+# small files uses a smaller buffer
+MAPPING_BUFFER_SIZE = 1024 * 1024
+
 logger = get_module_logger(__name__)
 
+# For checking whether a line contains anything besides separators
+_STRIP_SEPARATORS = str.maketrans("", "", " ,;")
+
 
 class Mapping:
     """All information needed for creating anonymization jobs
@@ -88,40 +96,33 @@ class Mapping:
             options = []
         self.options = options
         self.description = description
-        if type(dialect) == str:
-            self.dialect = csv.get_dialect(dialect)
-        else:
-            self.dialect = dialect
+        self.dialect = as_dialect(dialect)
 
     def __len__(self):
         return len(self.grid)
 
     def save_to(self, f: TextIO):
         """Write this Mapping to given stream"""
-        # write description
-        f.write(self.DESCRIPTION_HEADER + self.dialect.lineterminator)
-        f.write(self.description)
-        f.write(self.dialect.lineterminator)
-
-        # write options
-        f.write(self.OPTIONS_HEADER + self.dialect.lineterminator)
+        lineterminator = self.dialect.lineterminator
+        delimiter = self.dialect.delimiter
+        options = lineterminator.join(
+            [x.to_string(delimiter=delimiter) for x in self.options]
+        )
+        # description and options in one go, then the grid directly after
         f.write(
-            self.dialect.lineterminator.join(
+            lineterminator.join(
                 [
-                    x.to_string(delimiter=self.dialect.delimiter)
-                    for x in self.options
+                    self.DESCRIPTION_HEADER,
+                    self.description,
+                    self.OPTIONS_HEADER,
+                    options,
+                    "",
+                    self.GRID_HEADER,
+                    "",
                 ]
             )
         )
-        f.write(self.dialect.lineterminator)
-        f.write(self.dialect.lineterminator)
-
-        # write mapping
-        f.write(self.GRID_HEADER + self.dialect.lineterminator)
-        mapping_content = StringIO()
-        self.grid.save(mapping_content, dialect=self.dialect)
-        mapping_content.seek(0)
-        f.write(mapping_content.read())
+        self.grid.save(f, dialect=self.dialect)
 
     @classmethod
     def load(cls, lines: Iterable[str]):
@@ -134,9 +135,8 @@ class Mapping:
         """
 
         try:
-            lines = [
-                x for x in lines
-            ]  # make sure open file handles are read through
+            # split content into three sections. Reads through open files
+            sections = cls.parse_sections(lines)
         except OSError as e:
             if "raw readinto() returned invalid length" in str(e):
                 raise MappingLoadError(
@@ -147,23 +147,25 @@ class Mapping:
                 # Unsure which error this is. Can't handle this here.
                 raise
 
-        # split content into three sections
-        sections = cls.parse_sections(lines)
         description = "".join(sections[cls.DESCRIPTION_HEADER])
 
         options = [
             ParameterFactory.parse_from_string(line)
             for line in sections[cls.OPTIONS_HEADER]
-            if parameter_line_is_empty(line)
+            if parameter_line_has_content(line)
         ]
 
-        grid_content = os.linesep.join(sections[cls.GRID_HEADER])
-        grid = JobParameterGrid.load(StringIO(grid_content))
+        # parse_sections strips line endings. Put these back so that csv can
+        # read quoted values spanning several lines
+        grid_lines = [line + "\n" for line in sections[cls.GRID_HEADER]]
+        grid = JobParameterGrid.load(grid_lines)
         return cls(
             grid=grid,
             options=options,
             description=description,
-            dialect=sniff_dialect_safe(lines),
+            dialect=sniff_dialect_safe(
+                chain(sections[cls.OPTIONS_HEADER], grid_lines)
+            ),
         )
 
     @classmethod
@@ -189,35 +191,40 @@ class Mapping:
             If not all column_types can be found or are not in the expected order
 
         """
-        collected = defaultdict(list)
+        collected = {header: [] for header in cls.ALL_HEADERS}
         headers_to_find = cls.ALL_HEADERS.copy()
         header_to_find = headers_to_find.pop(0)
-        current_header = None
+        header_to_find_lower = header_to_find.lower()
+        append = None  # append to list of current section
+        lines = iter(lines)
         for line in lines:
-            line = (
-                line.replace("\r", "")
-                .replace("\n", "")
-                .rstrip(",")
-                .rstrip(";")
-            )
+            line = line.rstrip("\r\n,;")
             if not line:  # skip empty lines
                 continue
-            if header_to_find.lower() in line.lower():
+            # all headers contain '#'. Only lowercase lines that might match
+            if "#" in line and header_to_find_lower in line.lower():
                 # this is our header, start recording
-                current_header = header_to_find
-                # and look for the next one. If there is one.
-                if headers_to_find:
-                    header_to_find = headers_to_find.pop(0)
+                append = collected[header_to_find].append
+                if not headers_to_find:
+                    break  # this was the last section
+                header_to_find = headers_to_find.pop(0)
+                header_to_find_lower = header_to_find.lower()
                 continue  # skip header line itself
-            if current_header:
-                collected[current_header].append(line)
-
-        # check the results do we have all column_types?
-        if headers_to_find:
+            if append:
+                append(line)
+        else:
+            # loop ran out before the last header was found
             raise MappingLoadError(
-                f'Could not find required column_types "{headers_to_find}"'
+                'Could not find required column_types '
+                f'"{[header_to_find] + headers_to_find}"'
             )
 
+        # In the last section, no more headers to look for. Just collect
+        for line in lines:
+            line = line.rstrip("\r\n,;")
+            if line:
+                append(line)
+
         return collected
 
     @property
@@ -231,10 +238,11 @@ class Mapping:
         -------
             List[Parameter] for each row in grid
         """
+        options = {type(x): x for x in self.options}
         rows = []
         for grid_row in self.grid.rows:
-            row_dict = {type(x): x for x in self.options}
-            row_dict.update({type(x): x for x in grid_row})
+            row_dict = options.copy()
+            row_dict.update(zip(map(type, grid_row), grid_row))
             rows.append(list(row_dict.values()))
         return rows
 
@@ -265,13 +273,21 @@ class Mapping:
         return output
 
 
-def sniff_dialect(lines: Iterable[str]) -> Dialect:
+def sniff_dialect(lines: Iterable[str], extended: bool = False) -> Dialect:
     """Try to find out the separator character etc. from given opened csv file
 
+    Only separators comma and colon are considered. The first line containing
+    more of one than the other decides. This is much faster than csv.Sniffer,
+    which is only used for lines with quotes or if no line decides. Like
+    csv.Sniffer, spaces after each separator are skipped
+
     Parameters
     ----------
     lines: Iterable[str]
         Lines to sniff
+    extended: bool, optional
+        If True, use csv.Sniffer on each line, which also looks at quotes etc.
+        Defaults to False
 
     Raises
     ------
@@ -279,8 +295,23 @@ def sniff_dialect(lines: Iterable[str]) -> Dialect:
         When dialect cannot be determined
 
     """
-
-    for line in lines:
+    undecided = []  # lines with as many commas as colons
+    if extended:
+        undecided = lines
+    else:
+        for line in lines:
+            colons = line.count(";")
+            commas = line.count(",")
+            if colons > commas:
+                return dialect_for_line(line, ColonDelimited())
+            elif commas > colons:
+                return dialect_for_line(line, csv.excel())
+            elif commas:
+                undecided.append(line)
+            # no separators at all. Try next line
+
+    # No line decided on counts alone. Let csv.Sniffer look at quotes etc.
+    for line in undecided:
         try:
             return csv.Sniffer().sniff(line, delimiters=";,")
         except csv.Error:
@@ -288,9 +319,41 @@ def sniff_dialect(lines: Iterable[str]) -> Dialect:
     raise MapperError("Could not determine dialect for csv file")
 
 
-def parameter_line_is_empty(line_in: str) -> bool:
-    """True if the input line contains only separators or spaces. For cleaning"""
-    return bool(line_in.replace(" ", "").replace(",", "").replace(";", ""))
+def dialect_for_line(line: str, dialect: Dialect) -> Dialect:
+    """Finish sniffing the given line, now that its delimiter is known
+
+    Parameters
+    ----------
+    line: str
+        Line that has been sniffed
+    dialect: Dialect
+        Dialect with the delimiter found in line. Might be modified
+
+    Returns
+    -------
+    Dialect
+        Which skips initial space if each delimiter in line is followed by a
+        space, like csv.Sniffer does. If line contains quotes, csv.Sniffer is
+        used to find the quoting
+    """
+    delimiter = dialect.delimiter
+    if '"' in line or "'" in line:
+        try:
+            return csv.Sniffer().sniff(line, delimiters=delimiter)
+        except csv.Error:
+            pass  # use dialect as is
+    if line.count(delimiter) == line.count(delimiter + " "):
+        dialect.skipinitialspace = True
+    return dialect
+
+
+def parameter_line_has_content(line_in: str) -> bool:
+    """False if the input line contains only separators or spaces. For cleaning"""
+    return bool(line_in.translate(_STRIP_SEPARATORS))
+
+
+# Old name. This returned True for lines that are not empty
+parameter_line_is_empty = parameter_line_has_content
 
 
 def sniff_dialect_safe(
@@ -326,8 +389,8 @@ class JobParameterGrid:
         return len(self.rows)
 
     def width(self) -> int:
-        """Maximum number of columns in this grid"""
-        return max(len(x) for x in self.rows)
+        """Maximum number of columns in this grid. 0 for an empty grid"""
+        return max(map(len, self.rows), default=0)
 
     def append_row(self, row: List[Parameter]):
         """Append the given row to this grid"""
@@ -351,29 +414,39 @@ class JobParameterGrid:
             Defaults to 'excel'
 
         """
-        if type(dialect) == str:  # cast to Dialect instance if needed
-            dialect = csv.get_dialect(dialect)
+        dialect = as_dialect(dialect)
 
         # Which parameter types are there?
         params = self.parameter_types()
 
-        writer = csv.DictWriter(
-            f,
-            dialect=dialect,
-            fieldnames=[x.field_name for x in params],
-        )
-        writer.writeheader()
-        for row in self.rows:
-            writer.writerow({x.field_name: x.value for x in row})
+        column_idx = {x: i for i, x in enumerate(params)}
+        width = len(params)
+
+        def to_list(row: List[Parameter]) -> List:
+            """Values in the order of the columns. Empty if not in row"""
+            values = [""] * width
+            for param in row:
+                try:
+                    values[column_idx[type(param)]] = param.value
+                except KeyError as e:
+                    raise ValueError(
+                        f"Cannot save parameter '{param.field_name}'. "
+                        f"Not in {[x.field_name for x in params]}"
+                    ) from e
+            return values
+
+        writer = csv.writer(f, dialect=dialect)
+        writer.writerow([x.field_name for x in params])
+        writer.writerows(map(to_list, self.rows))
 
     @classmethod
-    def load(cls, f):
+    def load(cls, f: Union[TextIO, Iterable[str]]):
         """Load an instance from open file handle
 
         Parameters
         ----------
-        f
-            file object opened for reading
+        f: Union[TextIO, Iterable[str]]
+            file object opened for reading, or lines
 
         Returns
         -------
@@ -386,53 +459,45 @@ class JobParameterGrid:
             If mapping could not be loaded
 
         """
-        lines = f.readlines()
+        # read everything once. Lines are needed for sniffing and parsing
+        lines = f.readlines() if hasattr(f, "readlines") else list(f)
         dialect = sniff_dialect_safe(lines)
-        reader = csv.DictReader(lines, dialect=dialect)
+        reader = csv.reader(lines, dialect=dialect)
+        header = next(reader, [])
+        # Like csv.DictReader, use the last column for duplicate keys
+        column_indices = {key: idx for idx, key in enumerate(header)}
+        # resolve parameter type for each column only once
+        columns = [
+            (idx, ParameterFactory.parser_for_key(key))
+            for key, idx in column_indices.items()
+        ]
+        has_empty_key = "" in column_indices
         parameters = []
+        row = None
         try:
             for row in reader:
+                if not row:
+                    continue  # csv.DictReader skipped these as well
+                # check common problem: missing column header
+                if has_empty_key or len(row) > len(header):
+                    keys = [x for x in header if x]
+                    raise ParameterParsingError(
+                        f"Missing column header. I've got {len(row)} "
+                        f"values: {row} but only {len(keys)} headers: "
+                        f"({keys}). I don't know which is which now."
+                    )
+                length = len(row)
                 parameters.append(
-                    JobParameterGrid.parse_job_parameter_row(row)
+                    [
+                        parse(row[idx] if idx < length else None)
+                        for idx, parse in columns
+                    ]
                 )
         except ParameterParsingError as e:
-            raise MappingLoadError("Problem parsing '{row}'") from e
+            raise MappingLoadError(f"Problem parsing '{row}'") from e
 
         return cls(parameters)
 
-    @staticmethod
-    def parse_job_parameter_row(row: Dict[str, str]) -> List[Parameter]:
-        """Parse a dict of strings as Parameters, perform some initial checks for
-        more informative error messages
-
-        Parameters
-        ----------
-        Dict[str, str]
-            dict with parameter key: parameter value. As output by csv.DictReader
-
-        Returns
-        -------
-        List[Parameter]
-
-        Raises
-        ------
-        ParameterParsingError
-        """
-        # check common problem: missing column header
-        keys = [x for x in row.keys() if x]  # remove None and empty
-        values = list(row.values())
-        if len(keys) < len(values):
-            raise ParameterParsingError(
-                f"Missing column header. I've got {len(values)} "
-                f"values: {values} but only {len(keys)} headers: "
-                f"({keys}). I don't know which is which now."
-            )
-
-        return [
-            ParameterFactory.parse_from_key_value(key, val)
-            for key, val in row.items()
-        ]
-
     def parameter_types(self):
         """Sorted list of all classes of Parameter found in this list
 
@@ -445,7 +510,9 @@ class JobParameterGrid:
             rows.ALL_PARAMETERS
 
         """
-        types = {type(param) for row in self.rows for param in row}
+        types = set()
+        for row in self.rows:
+            types.update(map(type, row))
         return [x for x in ALL_PARAMETERS if x in types]
 
     def to_table_string(self, max_rows: Optional[int] = None):
@@ -470,14 +537,12 @@ class JobParameterGrid:
         else:
             rows = self.rows[:max_rows]
 
+        columns = [(x, table[x.field_name]) for x in types]
         for row in rows:
-            typed_row = {type(x): x for x in row}
-            for param_type in types:
-                try:
-                    instance = typed_row[param_type]
-                except KeyError:
-                    instance = param_type()
-                table[param_type.field_name].append(instance.value)
+            typed_row = dict(zip(map(type, row), row))
+            for param_type, column in columns:
+                instance = typed_row.get(param_type)
+                column.append("" if instance is None else instance.value)
 
         if max_rows is None:
             output = f"Parameter grid with {len(self.rows)} rows:\n\n"
@@ -496,8 +561,22 @@ class MappingFile:
     def __init__(self, file_path: Path):
         self.file_path = file_path
 
+    def read_buffer_size(self) -> int:
+        """Buffer size for reading this file. Large enough to read the file in
+        one go, but never larger than MAPPING_BUFFER_SIZE
+
+        Raises
+        ------
+        FileNotFoundError
+            If file does not exist
+        """
+        size = Path(self.file_path).stat().st_size
+        return min(max(size, io.DEFAULT_BUFFER_SIZE), MAPPING_BUFFER_SIZE)
+
     def save_mapping(self, mapping: Mapping):
-        with open(self.file_path, "w", newline="") as f:
+        with open(
+            self.file_path, "w", newline="", buffering=MAPPING_BUFFER_SIZE
+        ) as f:
             mapping.save_to(f)
 
     def load_mapping(self) -> Mapping:
@@ -513,7 +592,9 @@ class MappingFile:
             If mapping cannot be loaded
 
         """
-        with open(self.file_path, newline="") as f:
+        with open(
+            self.file_path, newline="", buffering=self.read_buffer_size()
+        ) as f:
             try:
                 return Mapping.load(f)
             except FileNotFoundError as e:
@@ -534,7 +615,9 @@ class MappingFile:
 
         """
         try:
-            with open(self.file_path, newline="") as f:
+            with open(
+                self.file_path, newline="", buffering=self.read_buffer_size()
+            ) as f:
                 return Mapping.load(f)
         except (FileNotFoundError, MapperError) as e:
             raise MapperError(
@@ -616,12 +699,36 @@ class MappingParameterSet(ParameterSet):
         )
 
 
+def as_dialect(dialect: Union[str, Dialect]) -> Dialect:
+    """Dialect instance for the given dialect name. Dialects are returned as is
+
+    Parameters
+    ----------
+    dialect: Union[str, Dialect]
+        Any Dialect or a name returned by csv.list_dialects()
+    """
+    if isinstance(dialect, str):
+        try:
+            return _NAMED_DIALECTS[dialect]
+        except KeyError:
+            return csv.get_dialect(dialect)
+    return dialect
+
+
 def get_local_dialect() -> Dialect:
     """Try to obtain best match for local CSV dialect
 
     Uses the heuristic that decimal separator comma goes together with
     list separator colon
     """
+    return _dialect_for_numeric_locale(locale.setlocale(locale.LC_NUMERIC))
+
+
+@lru_cache(maxsize=8)
+def _dialect_for_numeric_locale(numeric_locale: str) -> Dialect:
+    """Local dialect, cached per numeric locale name. Querying the locale name
+    is much cheaper than building the full localeconv() dict each call
+    """
     if locale.localeconv()["decimal_point"] == ",":
         return ColonDelimited()
     else:
@@ -640,3 +747,7 @@ class ColonDelimited(csv.excel):
     """Excel csv dialect, but with colon ';' delimiter"""
 
     delimiter = ";"
+
+
+# Most used dialects, looked up once
+_NAMED_DIALECTS = {"excel": csv.get_dialect("excel")}
@@ -10,7 +10,17 @@ import string
 import random
 from copy import copy
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple, Type
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
 
 from anonapi.exceptions import AnonAPIError
 from fileselection.fileselection import FileSelectionFile
@@ -236,7 +246,7 @@ class Parameter:
     legacy_field_names: List[str] = []
 
     def __init__(self, value: str = None):
-        if not value:
+        if value is None:
             value = ""
         self.value = str(value)
 
@@ -444,7 +454,9 @@ class ParameterFactory:
 
     @staticmethod
     def parse_from_key_value(
-        key, value, parameter_types: Optional[List[Type[Parameter]]] = None
+        key,
+        value,
+        parameter_types: Optional[Sequence[Type[Parameter]]] = None,
     ) -> Parameter:
         """Parse a key and value string into a valid Parmameter object
 
@@ -455,7 +467,7 @@ class ParameterFactory:
             like 'accession_number'
         value: str
             The value of the parameter, like '12345.234343'
-        parameter_types: Optional[Type[Parameter]], optional
+        parameter_types: Optional[Sequence[Type[Parameter]]], optional
             List of all Parameter types that will be tried for parsing. Defaults
             to parameter_classes.ALL_PARAMETERS
 
@@ -471,20 +483,64 @@ class ParameterFactory:
 
         """
         if parameter_types is None:
-            parameter_types = ALL_PARAMETERS
-        for param_type in parameter_types:
-            if key in param_type.field_names():
-                try:
-                    return param_type(value)
-                except UnknownSourceIdentifierException as e:
-                    raise ParameterParsingError(
-                        f"Error parsing source identifier:{e}"
-                    ) from e
+            param_type = ParameterFactory.parameter_type_for_key(key)
+            if param_type is not None:
+                return ParameterFactory.parse_from_value(value, param_type)
+        else:
+            for param_type in parameter_types:
+                if key in param_type.field_names():
+                    return ParameterFactory.parse_from_value(value, param_type)
         raise ParameterParsingError(
             f"Could not parse key={key}, value={value} to any known parameter. "
             f"Tried {[x.field_name for x in ALL_PARAMETERS]}"
         )
 
+    @staticmethod
+    def parameter_type_for_key(key: str) -> Optional[Type[Parameter]]:
+        """The type in ALL_PARAMETERS that has key as field name or legacy field
+        name. None if there is no such type
+        """
+        return PARAMETER_TYPES_BY_KEY.get(key)
+
+    @staticmethod
+    def parser_for_key(key: str) -> Callable[[str], Parameter]:
+        """Function that parses a value string to a Parameter of type for key.
+        For parsing many values with the same key, like a column in a csv file
+
+        Parameters
+        ----------
+        key: str
+            Parameter.key value indicating the type of parameter
+
+        Returns
+        -------
+        Callable[[str], Parameter]
+            Raises ParameterParsingError when called if key is not known
+        """
+        param_type = ParameterFactory.parameter_type_for_key(key)
+        if param_type is None:  # Let parse_from_key_value raise error
+            return partial(ParameterFactory.parse_from_key_value, key)
+        return partial(
+            ParameterFactory.parse_from_value, parameter_type=param_type
+        )
+
+    @staticmethod
+    def parse_from_value(value, parameter_type: Type[Parameter]) -> Parameter:
+        """Parse a value string into a Parameter of the given type. Like
+        parse_from_key_value(), for when the parameter type is already known
+
+        Raises
+        ------
+        ParameterParsingError
+            If parsing fails for any reason
+        """
+        try:
+            return parameter_type(value)
+        except UnknownSourceIdentifierException as e:
+            raise ParameterParsingError(
+                f"Error parsing source identifier:{e}"
+            ) from e
+
     @staticmethod
     def generate_pseudo_name() -> PseudoName:
         """Random pseudonym parameter. 8 characters, like '8GW7FEDQ'"""
@@ -670,6 +726,14 @@ COMMON_GLOBAL_PARAMETERS = [PIMSKey, DestinationPath, RootSourcePath, Project]
 
 ALL_PARAMETERS = COMMON_JOB_PARAMETERS + COMMON_GLOBAL_PARAMETERS
 
+# field name or legacy field name -> type. If a name is used by more than one
+# type, the first one in ALL_PARAMETERS wins
+PARAMETER_TYPES_BY_KEY = {
+    name: param_type
+    for param_type in reversed(ALL_PARAMETERS)
+    for name in param_type.field_names()
+}
+
 
 class ParameterError(AnonAPIError):
     pass
@@ -40,6 +40,16 @@ def use_logging():
     AnonAPILogController(logging.getLogger())
 
 
+@fixture(autouse=True)
+def clear_auth_blacklist():
+    """Credentials rejected by a server are remembered for all WebAPIClient
+    instances. Make sure a rejection in one test does not leak into another
+    """
+    WebAPIClient._AUTH_BLACKLIST.clear()
+    yield
+    WebAPIClient._AUTH_BLACKLIST.clear()
+
+
 @fixture
 def mock_requests(monkeypatch):
     """Make sure anonapi.client does not do any actuall http calls. Also makes it
@@ -50,7 +60,9 @@ def mock_requests(monkeypatch):
     RequestsMock
     """
     requests_mock = RequestsMock()
-    monkeypatch.setattr("anonapi.client.requests", requests_mock.requests)
+    monkeypatch.setattr(
+        "anonapi.client.create_session", lambda: requests_mock.requests
+    )
     return requests_mock
 
 
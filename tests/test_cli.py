@@ -37,10 +37,7 @@ def mock_requests(monkeypatch):
 
     """
     requests_mock = RequestsMock()
-    # maintain vanilla requests errors because these need to be importable even
-    # when mocking
-    requests_mock.exceptions = requests.exceptions
-    monkeypatch.setattr("anonapi.client.requests", requests_mock)
+    monkeypatch.setattr("anonapi.client.create_session", lambda: requests_mock)
     return requests_mock
 
 
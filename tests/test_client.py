@@ -11,9 +11,15 @@ from anonapi.client import (
     APIClientAuthorizationFailedException,
     APIClientError,
     AnonClientTool,
+    ServerNotResponding,
+    create_session,
 )
+from anonapi.objects import RemoteAnonServer
 from tests.factories import RequestsMock
-from tests.mock_responses import RequestsMockResponseExamples
+from tests.mock_responses import (
+    RequestMockResponse,
+    RequestsMockResponseExamples,
+)
 
 
 def test_basic_client(mocked_requests_client: WebAPIClient):
@@ -151,6 +157,29 @@ def test_response_code_handling(mocked_requests_client: WebAPIClient):
         client.get("get_jobs")
     assert "Your credentials do not seem to work" in str(exception.value)
 
+    # Known bad credentials should not be sent to the server again
+    requests_mock.reset()
+    with pytest.raises(APIClientAuthorizationFailedException):
+        client.get("get_jobs")
+    assert not requests_mock.called()
+    with pytest.raises(APIClientAuthorizationFailedException):
+        WebAPIClient(
+            hostname="test.host", username="testuser", token="token"
+        ).post("cancel_job", job_id=1)
+    assert not requests_mock.called()
+
+    # A different token is different credentials. Should reach the server
+    other_client = WebAPIClient(
+        hostname="test.host", username="testuser", token="new_token"
+    )
+    other_client.requestslib = client.requestslib
+    requests_mock.set_response_text(
+        text=RequestsMockResponseExamples.JOB_INFO, status_code=200
+    )
+    other_client.get("get_job", job_id=3)
+    assert requests_mock.called()
+    client.reset_auth()
+
     # Superweird unexpected response from server should still raise correct exception
     requests_mock.set_response_text(
         text="Abandon all hope, ye who receive", status_code=666
@@ -162,3 +191,168 @@ def test_response_code_handling(mocked_requests_client: WebAPIClient):
 
 def test_client_tool_create():
     AnonClientTool(username="user", token="token")
+
+
+@pytest.fixture
+def bulk_tool(mock_requests):
+    """An AnonClientTool and a server that supports bulk job modification. Does
+    not do any actual http calls
+
+    Returns
+    -------
+    (AnonClientTool, RemoteAnonServer, RequestsMock)
+        tool, server, and the mocked requests lib which answers with
+        documentation listing the bulk function
+    """
+    tool = AnonClientTool(username="user", token="token")
+    server = RemoteAnonServer(name="test", url="https://test.host")
+    mock_requests.set_response_text(
+        text='{"documentation": {"handlers": {"/modify_jobs_bulk": {}}}}',
+        status_code=404,
+    )
+    return tool, server, mock_requests
+
+
+def test_client_tool_reset_jobs_bulk(bulk_tool):
+    """If the server supports bulk modification, reset all jobs in one call"""
+    tool, server, mock_requests = bulk_tool
+
+    infos = tool.reset_jobs(server=server, job_ids=["1", "2", "3"])
+    assert len(infos) == 3
+    assert mock_requests.requests.post.call_count == 1
+    assert mock_requests.requests.post.call_args[1]["data"]["job_ids"] == [
+        "1",
+        "2",
+        "3",
+    ]
+
+    # server capabilities should be checked only once
+    tool.set_opt_out_ignore_bulk(server=server, job_ids=["1"], reason="test")
+    assert mock_requests.requests.get.call_count == 1
+
+
+def test_client_tool_bulk_error(bulk_tool):
+    """A failing bulk call should yield an error message for each job"""
+    tool, server, mock_requests = bulk_tool
+    mock_requests.requests.post.return_value = (
+        RequestsMock.create_response_object(
+            400, RequestsMockResponseExamples.JOB_DOES_NOT_EXIST
+        )
+    )
+
+    infos = tool.reset_jobs(server=server, job_ids=["1", "2"])
+    assert len(infos) == 2
+    assert all("Error resetting job" in x for x in infos)
+
+    infos = tool.set_opt_out_ignore_bulk(
+        server=server, job_ids=["1", "2"], reason="test"
+    )
+    assert len(infos) == 2
+    assert "job 2" in infos[1]
+
+
+def test_client_tool_supports_bulk_not_cached_on_error(bulk_tool):
+    """Not being able to reach the server says nothing about bulk support"""
+    tool, server, mock_requests = bulk_tool
+    mock_requests.set_response_exception(requests.exceptions.ConnectionError)
+    assert not tool.supports_bulk_modify(server)
+
+    mock_requests.requests.get.side_effect = None  # server is back
+    assert tool.supports_bulk_modify(server)
+
+
+def test_client_tool_supports_bulk_handlers_only(bulk_tool):
+    """Only a documented handler counts, not a mention anywhere else"""
+    tool, server, mock_requests = bulk_tool
+    mock_requests.set_response_text(
+        text='{"documentation": {"overview": "modify_jobs_bulk is coming",'
+        ' "handlers": {"/modify_job": {}}}}',
+        status_code=404,
+    )
+    assert not tool.supports_bulk_modify(server)
+
+
+def test_client_tool_reset_jobs_fallback(bulk_tool):
+    """Without bulk support on the server, each job is reset separately"""
+    tool, server, mock_requests = bulk_tool
+    mock_requests.set_response_text(
+        text=RequestsMockResponseExamples.API_CALL_NOT_DEFINED, status_code=404
+    )
+
+    infos = tool.reset_jobs(server=server, job_ids=["1", "2", "3"])
+    assert infos == [f"Reset job {x} on {server}" for x in ["1", "2", "3"]]
+    assert mock_requests.requests.post.call_count == 3
+
+
+def test_client_function_urls(mocked_requests_client: WebAPIClient):
+    """API functions are called on hostname/function_name"""
+    client, requests_mock = mocked_requests_client
+    requests_mock.set_response_text(text=RequestsMockResponseExamples.JOB_INFO)
+
+    client.get("get_job", job_id=3)
+    assert requests_mock.requests.get.call_args[0][0] == "test.host/get_job"
+
+    client.post("cancel_job", job_id=3)
+    assert requests_mock.requests.post.call_args[0][0] == "test.host/cancel_job"
+
+
+def test_client_post_json(mocked_requests_client: WebAPIClient):
+    """Post arguments can be sent as JSON. Fall back to form-encoded if the
+    server does not accept this
+    """
+    client, requests_mock = mocked_requests_client
+    client.post_json = True
+    requests_mock.set_response_text(text=RequestsMockResponseExamples.JOB_INFO)
+
+    client.post("modify_job", job_id=3, status="INACTIVE")
+    _, kwargs = requests_mock.requests.post.call_args
+    assert kwargs["headers"]["Content-Type"] == "application/json"
+    assert '"job_id": 3' in kwargs["data"]
+
+    requests_mock.reset()
+    requests_mock.set_responses(
+        [
+            RequestMockResponse("unsupported media type", 415),
+            RequestMockResponse(RequestsMockResponseExamples.JOB_INFO, 200),
+        ]
+    )
+    client.post("modify_job", job_id=3, status="INACTIVE")
+    assert requests_mock.requests.post.call_count == 2
+    _, kwargs = requests_mock.requests.post.call_args
+    assert kwargs["data"]["job_id"] == 3
+    assert not client.post_json
+
+
+def test_client_get_or_error(mocked_requests_client: WebAPIClient):
+    """Errors can be returned instead of raised"""
+    client, requests_mock = mocked_requests_client
+    requests_mock.set_response_text(
+        text=RequestsMockResponseExamples.JOB_DOES_NOT_EXIST, status_code=400
+    )
+    response, error = client.get_or_error("get_job", job_id=100)
+    assert response is None
+    assert "does not exist" in str(error)
+    assert isinstance(error.to_exception(), APIClientAPIException)
+
+    requests_mock.set_response_exception(requests.exceptions.ConnectionError)
+    _, error = client.post_or_error("cancel_job", job_id=100)
+    assert isinstance(error.to_exception(), ServerNotResponding)
+
+
+def test_client_tool_cancel_job_error(mock_requests):
+    """API errors should end up in the returned message"""
+    tool = AnonClientTool(username="user", token="token")
+    server = RemoteAnonServer(name="test", url="https://test.host")
+    mock_requests.set_response_text(
+        text=RequestsMockResponseExamples.JOB_DOES_NOT_EXIST, status_code=400
+    )
+    assert "does not exist" in tool.cancel_job(server=server, job_id=100)
+
+
+def test_create_session():
+    """Sessions should retry temporary failures, but never resend a POST"""
+    retry = create_session().get_adapter("https://test.host").max_retries
+    assert retry.total == 3
+    assert 503 in retry.status_forcelist
+    assert "GET" in retry.allowed_methods
+    assert "POST" not in retry.allowed_methods
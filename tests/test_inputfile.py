@@ -2,16 +2,26 @@ import pytest
 
 from anonapi.inputfile import (
     AccessionNumberColumn,
+    CSVFile,
+    EmptyRow,
     ExcelFile,
     FolderColumn,
     InputFileError,
+    InputFileParseException,
+    ParameterColumn,
     PseudonymColumn,
+    RowParseError,
+    TabularFile,
     as_tabular_file,
     extract_parameter_grid,
+    parse_columns,
+    parse_row,
+    parse_rows,
+    row_is_fully_empty,
 )
+from anonapi.parameters import SourceIdentifierParameter
 from tests import RESOURCE_PATH
 
-
 LOCAL_RESOURCE_PATH = RESOURCE_PATH / "test_inputfile"
 FORMATS_PATH = LOCAL_RESOURCE_PATH / "formats"
 
@@ -145,3 +155,211 @@ def test_reading_single_column():
     grid = extract_parameter_grid(input_file)
     assert len(grid.rows) == 3
     assert str(grid.rows[2][0].path) == "andanother"
+
+
+@pytest.mark.parametrize(
+    "header, column_type, matches",
+    [
+        ("Accession Number", AccessionNumberColumn, True),
+        ("accession_number", AccessionNumberColumn, True),
+        ("Acc.-Nr", AccessionNumberColumn, True),
+        ("PseudoID", PseudonymColumn, True),
+        ("Pseudo ID", AccessionNumberColumn, False),
+        (None, FolderColumn, False),
+        (12345, AccessionNumberColumn, False),
+    ],
+)
+def test_matches_header(header, column_type, matches):
+    """Header matching should ignore case and separators"""
+    assert column_type.matches_header(header) == matches
+
+
+def test_parse_columns():
+    """Each cell matches at most one column type, each type matches at most
+    one cell
+    """
+    columns = parse_columns(
+        row=["pseudonym", None, "acc nr", "name"],
+        column_types=[AccessionNumberColumn, PseudonymColumn, FolderColumn],
+    )
+    assert [(type(x), x.column) for x in columns] == [
+        (PseudonymColumn, 0),
+        (AccessionNumberColumn, 2),
+    ]
+
+
+def test_parse_row():
+    """Rows should be either completely filled or completely empty"""
+    columns = [AccessionNumberColumn(column=0), PseudonymColumn(column=2)]
+
+    parsed = parse_row(["123", "ignored", "patient1"], columns=columns)
+    assert [x.value for x in parsed] == ["123", "patient1"]
+
+    # excel files can contain numbers. These are cast to string when parsing
+    parsed = parse_row([123, "ignored", "patient1"], columns=columns)
+    assert [x.value for x in parsed] == ["123", "patient1"]
+
+    with pytest.raises(EmptyRow):
+        parse_row(["", "ignored", None], columns=columns)
+
+    with pytest.raises(RowParseError):
+        parse_row(["123", "ignored", ""], columns=columns)
+
+    # rows from csv files can be shorter than the header row
+    with pytest.raises(EmptyRow):
+        parse_row([""], columns=columns)
+    with pytest.raises(RowParseError):
+        parse_row(["123"], columns=columns)
+
+
+class SourceColumn(ParameterColumn):
+    header_names = ["source"]
+    parameter_type = SourceIdentifierParameter
+
+
+class ListFile(TabularFile):
+    def __init__(self, rows):
+        self._rows = rows
+
+    def rows(self):
+        return iter(self._rows)
+
+
+def test_extract_parameter_grid_parse_error():
+    """Values that cannot be parsed should yield an error with row number"""
+    input_file = ListFile(
+        [["source"], ["folder:/some/folder"], ["unknown_type:something"]]
+    )
+    with pytest.raises(InputFileParseException) as e:
+        extract_parameter_grid(
+            input_file, optional_column_types=[SourceColumn]
+        )
+    assert "row 3" in str(e.value)
+
+
+def test_parse_rows():
+    """Parsing all rows at once should skip empty rows, like parse_row"""
+    columns = [AccessionNumberColumn(column=0), PseudonymColumn(column=2)]
+    rows = [["1", "", "patient1"], ["", "ignored"], [2, None, "patient2"]]
+
+    parsed = parse_rows(rows, columns=columns)
+    assert [[x.value for x in row] for row in parsed] == [
+        ["1", "patient1"],
+        ["2", "patient2"],
+    ]
+
+    with pytest.raises(RowParseError):
+        parse_rows(rows + [["3"]], columns=columns)
+
+
+def test_extract_parameter_grid_parse_error_row_number(monkeypatch):
+    """Errors should point to the right row, also when rows are parsed in
+    chunks
+    """
+    monkeypatch.setattr("anonapi.inputfile.GRID_CHUNK_SIZE", 2)
+    input_file = ListFile(
+        [["source"]]
+        + [["folder:/some/folder"]] * 4
+        + [["unknown_type:something"]]
+    )
+    with pytest.raises(InputFileParseException) as e:
+        extract_parameter_grid(
+            input_file, optional_column_types=[SourceColumn]
+        )
+    assert "row 6" in str(e.value)
+
+
+def test_extract_parameter_grid_rows_list(monkeypatch):
+    """rows() may return a list instead of an iterator"""
+    monkeypatch.setattr("anonapi.inputfile.GRID_CHUNK_SIZE", 2)
+
+    class ListRowsFile(TabularFile):
+        def rows(self):
+            return [["folder"], ["a"], ["b"], ["c"]]
+
+    grid = extract_parameter_grid(
+        ListRowsFile(), optional_column_types=[FolderColumn]
+    )
+    assert [str(row[0].path) for row in grid.rows] == ["a", "b", "c"]
+
+
+def test_extract_parameter_grid_closes_file():
+    """Reading should be stopped properly, also when parsing fails early"""
+    closed = []
+
+    class GeneratorFile(TabularFile):
+        def rows(self):
+            try:
+                yield from [["folder"], ["a"], ["b"]]
+            finally:
+                closed.append(True)
+
+    with pytest.raises(InputFileError):
+        extract_parameter_grid(
+            GeneratorFile(), required_column_types=[PseudonymColumn]
+        )
+    assert closed
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("accession_number,pseudonym\n", True),
+        ("accession_number, pseudonym\n", False),
+        ("accession_number;pseudonym\n", False),
+        ('"accession,number",pseudonym\n', False),
+        ("accession_number\n", False),
+    ],
+)
+def test_is_plain_comma_separated(line, expected):
+    """Only lines the excel dialect surely reads correctly should skip
+    sniffing
+    """
+    assert CSVFile.is_plain_comma_separated(line) == expected
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "accession number, pseudonym\n123, patient1\n",
+        "accession number; pseudonym\n123; patient1\n",
+    ],
+)
+def test_csv_space_after_separator(tmp_path, content):
+    """Spaces after separators should not end up in values"""
+    path = tmp_path / "input.csv"
+    path.write_text(content)
+    grid = extract_parameter_grid(CSVFile(path))
+    assert [x.value for x in grid.rows[0]] == ["123", "patient1"]
+
+
+def test_row_is_fully_empty():
+    """Only the given columns should be checked"""
+    assert row_is_fully_empty(["", "something", None], col_indices=(0, 2))
+    assert not row_is_fully_empty(["", "something", None], col_indices=(1,))
+
+
+def test_cast_rows_to_string():
+    """Everything should become string, except None"""
+    rows = [("a", 1, None), (2.5, None, "b")]
+    assert list(ExcelFile.cast_rows_to_string(iter(rows))) == [
+        ["a", "1", None],
+        ["2.5", None, "b"],
+    ]
+
+
+def test_parameter_column_row_methods():
+    """Deprecated row-based methods should still work"""
+    column = AccessionNumberColumn(column=1)
+    assert str(column.parameter_from_row(["x", "1234"])) == (
+        "accession_number,1234"
+    )
+    assert not column.has_empty_value(["x", "1234"])
+    assert column.has_empty_value(["x", None])
+    assert column.has_empty_value(["x"])
+
+
+def test_drop_trailing_empty_rows():
+    """Empty rows at the end of an excel sheet should not be returned"""
+    rows = [("a", None), (None, None), ("b", "c"), (None, None), (None, None)]
+    assert list(ExcelFile.drop_trailing_empty_rows(iter(rows))) == rows[:3]
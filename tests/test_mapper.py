@@ -1,5 +1,5 @@
 import locale
-from io import StringIO, TextIOWrapper
+from io import DEFAULT_BUFFER_SIZE, StringIO, TextIOWrapper
 from pathlib import Path
 from unittest.mock import Mock
 
@@ -8,14 +8,17 @@ from fileselection.fileselection import FileSelectionFile
 
 from anonapi.cli.map_commands import create_example_mapping
 from anonapi.mapper import (
+    MAPPING_BUFFER_SIZE,
     JobParameterGrid,
     MapperError,
     MappingFile,
     MappingLoadError,
     Mapping,
+    get_local_dialect,
     sniff_dialect,
 )
 from anonapi.parameters import (
+    Description,
     PathParameter,
     PseudoName,
     SourceIdentifierFactory,
@@ -91,6 +94,35 @@ def test_job_parameter_grid_load():
     assert len(grid.rows) == 20
 
 
+def test_job_parameter_grid_load_columns():
+    """Columns are matched by position. Short rows get None values, a value
+    without header is an error
+    """
+    grid = JobParameterGrid.load(
+        ["pseudo_name,pims_key,pseudo_name\n", "a,1,b\n", "\n", "c,2\n"]
+    )
+    assert [[(type(x), x.value) for x in row] for row in grid.rows] == [
+        [(PseudoName, "b"), (PIMSKey, "1")],  # last duplicate wins
+        [(PseudoName, ""), (PIMSKey, "2")],
+    ]
+
+    with pytest.raises(MappingLoadError):
+        JobParameterGrid.load(["pseudo_name,pims_key\n", "a,1,2\n"])
+
+
+@pytest.mark.parametrize(
+    "lines",
+    [
+        ("pims_key\n", "1\n"),
+        (x for x in ["pims_key\n", "1\n"]),
+        StringIO("pims_key\n1\n"),
+    ],
+)
+def test_job_parameter_grid_load_lines(lines):
+    """Any iterable of lines can be loaded, not just lists and files"""
+    assert JobParameterGrid.load(lines).rows[0][0].value == "1"
+
+
 def test_job_parameter_grid_load_colon():
     mapping_file = RESOURCE_PATH / "test_mapper" / "example_job_grid_colon.csv"
     with open(mapping_file, newline="") as f:
@@ -148,6 +180,49 @@ def test_mapping_parse_exceptions(content):
         _ = Mapping.parse_sections(stream)
 
 
+def test_mapping_parse_sections_grid_last():
+    """The grid section is required and runs until the end of the file"""
+    lines = [
+        "## Description ##",
+        "a mapping",
+        "## Options ##",
+        "",
+        "## Mapping ##",
+        "source,patient_id",
+        "folder:/## Mapping ##,1",
+    ]
+    sections = Mapping.parse_sections(lines)
+    assert sections[Mapping.GRID_HEADER] == lines[5:]
+
+    with pytest.raises(MappingLoadError):
+        Mapping.parse_sections(lines[:4])
+
+
+def test_job_parameter_grid_width(a_grid_of_parameters):
+    assert JobParameterGrid(a_grid_of_parameters).width() == 4
+    assert JobParameterGrid([]).width() == 0
+
+
+def test_mapping_save_load_multi_line_value():
+    """Quoted values in the grid can span several lines"""
+    mapping = Mapping(
+        JobParameterGrid(
+            [
+                [
+                    SourceIdentifierParameterFactory(),
+                    Description("line one\r\nline two"),
+                ]
+            ]
+        )
+    )
+    f = StringIO()
+    mapping.save_to(f)
+    f.seek(0)
+    loaded = Mapping.load(f)
+
+    assert loaded.grid.rows[0][1].value == "line one\nline two"
+
+
 def test_mapping_parse_colon_separated():
     """Excel in certain locales will save with colons. Make sure this works"""
 
@@ -276,6 +351,10 @@ def test_format_job_info(a_grid_of_parameters):
 
     assert "with 15 rows" in as_string
 
+    # parameters missing from a row should just be empty
+    as_string = JobParameterGrid(rows=[[PseudoName("test")]]).to_table_string()
+    assert "test" in as_string
+
 
 def test_mapping_folder_read_write(tmpdir, a_grid_of_parameters):
     """Test creating reading and deleting mappings in folder"""
@@ -300,6 +379,16 @@ def test_mapping_folder_read_write(tmpdir, a_grid_of_parameters):
     ] == [str(x) for row in mapping.rows for x in row]
 
 
+def test_mapping_file_read_buffer_size(tmpdir):
+    """Small files should not get a full size read buffer"""
+    path = Path(tmpdir) / "a_mapping.csv"
+    path.write_text("small")
+    assert MappingFile(path).read_buffer_size() == DEFAULT_BUFFER_SIZE
+
+    path.write_text("x" * (MAPPING_BUFFER_SIZE + 1))
+    assert MappingFile(path).read_buffer_size() == MAPPING_BUFFER_SIZE
+
+
 def test_os_error():
     with open(
         RESOURCE_PATH / "test_mapper" / "anon_mapping_os_error.csv"
@@ -344,6 +433,32 @@ def test_sniff_dialect(content, delimiter):
     assert dialect.delimiter == delimiter
 
 
+@pytest.mark.parametrize(
+    "line, delimiter",
+    [
+        ("a;b;c, with comma", ";"),
+        ('"a;b",c', ","),  # equal number. Should look at quotes
+        (['"a;b",c', "a;b;c"], ";"),  # a later line can decide on counts
+    ],
+)
+def test_sniff_dialect_counts(line, delimiter):
+    """The most common separator wins, unless it's a tie"""
+    lines = [line] if isinstance(line, str) else line
+    assert sniff_dialect(lines).delimiter == delimiter
+
+
+def test_sniff_dialect_skipinitialspace():
+    """Like csv.Sniffer, skip spaces only if each separator has one"""
+    assert sniff_dialect(["a, b, c"]).skipinitialspace
+    assert sniff_dialect(["a; b; c"]).skipinitialspace
+    assert not sniff_dialect(["a,b, c"]).skipinitialspace
+
+
+def test_sniff_dialect_extended():
+    """Using csv.Sniffer should still be possible"""
+    assert sniff_dialect(["a;b;c"], extended=True).delimiter == ";"
+
+
 def test_sniff_dialect_exception():
     with pytest.raises(MapperError) as e:
         sniff_dialect(StringIO(initial_value="Just not a csv file."))
@@ -395,6 +510,25 @@ def test_write_new_mapping(monkeypatch, locale_setting, delimiter):
         assert sniff_dialect(lines[9]).delimiter == delimiter
 
 
+def test_get_local_dialect_follows_locale(monkeypatch):
+    """Dialect is cached, but should still change when the locale changes"""
+    monkeypatch.setattr(
+        "anonapi.mapper.locale.setlocale", lambda category: "en_US.UTF-8"
+    )
+    monkeypatch.setattr(
+        "anonapi.mapper.locale.localeconv", lambda: {"decimal_point": "."}
+    )
+    assert get_local_dialect().delimiter == ","
+
+    monkeypatch.setattr(
+        "anonapi.mapper.locale.setlocale", lambda category: "nl_NL.UTF-8"
+    )
+    monkeypatch.setattr(
+        "anonapi.mapper.locale.localeconv", lambda: {"decimal_point": ","}
+    )
+    assert get_local_dialect().delimiter == ";"
+
+
 def test_example_job_grid_save_correct_csv():
     """The initial mapping should be easily parsed as a csv. This means adding
     empty delimiters at the end of comments and section headers
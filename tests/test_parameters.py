@@ -56,6 +56,32 @@ def test_parameter_factory_legacy_keys():
     assert parsed.field_name == "pseudo_id"
 
 
+def test_parameter_empty_value():
+    """None means no value. Other values like 0 should be kept"""
+    assert PseudoID().value == ""
+    assert PseudoID(None).value == ""
+    assert PseudoID(0).value == "0"
+
+
+def test_parameter_type_for_key():
+    """Legacy keys should work as well. Unknown keys yield None"""
+    assert ParameterFactory.parameter_type_for_key("pseudo_id") is PseudoID
+    assert ParameterFactory.parameter_type_for_key("patient_id") is PseudoID
+    assert ParameterFactory.parameter_type_for_key("flims_key") is None
+
+
+def test_parser_for_key():
+    """A parser can be obtained once and used for many values"""
+    parse = ParameterFactory.parser_for_key("patient_id")
+    assert [type(x) for x in map(parse, ["1", "2"])] == [PseudoID, PseudoID]
+    assert parse("1").value == "1"
+
+    # unknown keys only fail when parsing
+    parse = ParameterFactory.parser_for_key("flims_key")
+    with pytest.raises(ParameterParsingError):
+        parse("1")
+
+
 @pytest.mark.parametrize(
     "input_string",
     [